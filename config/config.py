@@ -7,54 +7,75 @@ See config-example.ini for an example configuration file.
 
 import os
 import configparser
-from typing import Any, Dict, Optional
+import functools
+from typing import Any, Dict, Mapping, Optional
 
 """
 Inspired from
 https://alexandra-zaharia.github.io/posts/python-configuration-and-dataclasses/
 """
 
+_BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Options stored as int once at load time, as (section, option) pairs.
+INT_OPTIONS = (
+    ("alerts", "alert_new_time_window_minutes"),
+    ("alerts", "alert_reminder_limit"),
+    ("email", "port"),
+)
+
+# Options stored as bool once at load time, as (section, option) pairs.
+BOOL_OPTIONS = (
+    ("alerts", "alert_new"),
+    ("alerts", "alert_new_get_by_time_window"),
+    ("alerts", "alert_new_get_by_last_update"),
+    ("alerts", "alert_reminder"),
+    ("alerts", "include_channel"),
+    ("debug", "log_children"),
+    ("debug", "save_logs_to_file"),
+)
+
+# Required options, as (section, option, label) tuples,
+# and the values that mean they were left unset.
+REQUIRED_OPTIONS = (
+    ("telegram", "api_id", "API ID"),
+    ("telegram", "api_hash", "API hash"),
+    ("email", "address", "email address"),
+    ("email", "password", "email password"),
+    ("email", "host", "email host"),
+    ("email", "port", "email port"),
+)
+PLACEHOLDERS = frozenset(
+    {
+        "",
+        "YOUR_API_ID",
+        "YOUR_API_HASH",
+        "YOUR_EMAIL_ADDRESS",
+        "YOUR_EMAIL_PASSWORD",
+        "YOUR_EMAIL_HOST",
+        "YOUR_EMAIL_PORT",
+    }
+)
+
+LOG_LEVELS = frozenset({"DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"})
+
 
 class DynamicConfig:
     """
     A class to represent a custom dynamic configuration object.
     """
 
-    def __init__(self, conf: Dict[str, Any]):
+    def __init__(self, conf: Mapping[str, Any]):
         """
         Initializes the DynamicConfig object and sets the configuration values
-        as attributes using setattr.
-        """
-        self._raw: Dict[str, Any] = conf
-
-        for key, value in self._raw.items():
-            setattr(self, key, value)
-
-    def __setattr__(self, name: str, value: Any) -> None:
-        """
-        Sets the attribute value.
+        as attributes in a single update of the instance dictionary.
 
         Args:
-            name (str): The name of the attribute.
-            value (Any): The value of the attribute.
-        """
-        super().__setattr__(name, value)
-
-    def __getattr__(self, name: str) -> Any:
-        """
-        Gets the attribute value.
-
-        Args:
-            name (str): The name of the attribute.
-
-        Returns:
-            Any: The value of the attribute.
+            conf (Mapping[str, Any]): The configuration values, e.g.
+                a configparser.SectionProxy.
         """
-        if name in self._raw:
-            return self._raw[name]
-        raise AttributeError(
-            f"'{self.__class__.__name__}' object has no attribute '{name}'"
-        )
+        self._raw: Mapping[str, Any] = conf
+        self.__dict__.update(conf)
 
 
 class ConfigIni:
@@ -74,33 +95,29 @@ class ConfigIni:
         """
         self._raw: configparser.ConfigParser = conf
         self._config_path: str = config_path
-        for key, value in self._raw.items():
-            setattr(self, key, DynamicConfig(dict(value.items())))
+        self._load_sections()
 
-    def __setattr__(self, name: str, value: Any) -> None:
+    def _load_sections(self) -> None:
         """
-        Sets the attribute value.
-
-        Args:
-            name (str): The name of the attribute.
-            value (Any): The value of the attribute.
+        Sets each section as a DynamicConfig attribute and converts
+        the integer and boolean options to their final type once.
         """
-        super().__setattr__(name, value)
-
-    def __getattr__(self, name: str) -> Any:
-        """
-        Gets the attribute value.
-
-        Args:
-            name (str): The name of the attribute.
-
-        Returns:
-            Any: The value of the attribute."""
-        if name in self._raw:
-            return DynamicConfig(dict(self._raw[name].items()))
-        raise AttributeError(
-            f"'{self.__class__.__name__}' object has no attribute '{name}'"
-        )
+        for key, value in self._raw.items():
+            setattr(self, key, DynamicConfig(value))
+
+        for options, converter in (
+            (INT_OPTIONS, self._raw.getint),
+            (BOOL_OPTIONS, self._raw.getboolean),
+        ):
+            for section, option in options:
+                if not self._raw.has_option(section, option):
+                    continue
+                try:
+                    value = converter(section, option)
+                    setattr(getattr(self, section), option, value)
+                except ValueError:
+                    # left as is; reported by validate_config
+                    pass
 
     def getboolean(self, section: str, option: str) -> bool:
         """
@@ -175,6 +192,25 @@ class ConfigIni:
         return self._pretty_print_config(config, 4)
 
 
+@functools.lru_cache(maxsize=None)
+def _load_config_file(config_path: str, mtime_ns: int) -> ConfigIni:
+    """
+    Parses the configuration file. Cached on the path and modification time
+    so that the file is only parsed again when it changes.
+
+    Args:
+        config_path (str): The path to the configuration file.
+        mtime_ns (int): The modification time of the file, in nanoseconds.
+
+    Returns:
+        ConfigIni: The configuration object.
+    """
+    cfg_parser = configparser.ConfigParser()
+    cfg_parser.read(config_path)
+
+    return ConfigIni(cfg_parser, config_path)
+
+
 def load_config(base_dir: Optional[str] = None) -> ConfigIni:
     """
     Loads the configuration file (either config.ini or config-example.ini).
@@ -188,19 +224,30 @@ def load_config(base_dir: Optional[str] = None) -> ConfigIni:
         ConfigIni: The configuration object.
     """
     if base_dir is None:
-        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        base_dir = _BASE_DIR
 
-    if os.path.isfile("config/config.ini"):
-        config_path = "config/config.ini"
-    elif os.path.isfile("config/config-example.ini"):
-        config_path = "config/config-example.ini"
+    for filename in ("config.ini", "config-example.ini"):
+        config_path = os.path.join(base_dir, "config", filename)
+        if os.path.isfile(config_path):
+            break
     else:
         raise FileNotFoundError("Config file not found")
 
-    cfg_parser = configparser.ConfigParser()
-    cfg_parser.read(config_path)
+    return _load_config_file(config_path, os.stat(config_path).st_mtime_ns)
 
-    return ConfigIni(cfg_parser, config_path)
+
+def reload_config(base_dir: Optional[str] = None) -> ConfigIni:
+    """
+    Clears the cached configuration and loads the configuration file again.
+
+    Args:
+        base_dir (Optional[str]): The base directory.
+
+    Returns:
+        ConfigIni: The configuration object.
+    """
+    _load_config_file.cache_clear()
+    return load_config(base_dir)
 
 
 def validate_config(config: ConfigIni) -> None:
@@ -210,6 +257,10 @@ def validate_config(config: ConfigIni) -> None:
     Args:
         config (ConfigIni): The configuration object.
     """
+    for section, option in BOOL_OPTIONS:
+        if not isinstance(getattr(getattr(config, section), option), bool):
+            raise ValueError(f"Please set {option} to 0 or 1 in config.ini")
+
     if (
         config.alerts.alert_new_get_by_time_window is True
         and config.alerts.alert_new_get_by_last_update is True
@@ -228,25 +279,15 @@ def validate_config(config: ConfigIni) -> None:
             cannot both be set to 0"""
         )
 
-    if config.telegram.api_id in ["", "YOUR_API_ID"]:
-        raise ValueError("Please set your API ID in config.ini")
-
-    if config.telegram.api_hash in ["", "YOUR_API_HASH"]:
-        raise ValueError("Please set your API hash in config.ini")
-
-    if config.email.address in ["", "YOUR_EMAIL_ADDRESS"]:
-        raise ValueError("Please set your email address in config.ini")
-
-    if config.email.password in ["", "YOUR_EMAIL_PASSWORD"]:
-        raise ValueError("Please set your email password in config.ini")
-
-    if config.email.host in ["", "YOUR_EMAIL_HOST"]:
-        raise ValueError("Please set your email host in config.ini")
+    for section, option, label in REQUIRED_OPTIONS:
+        if getattr(getattr(config, section), option) in PLACEHOLDERS:
+            raise ValueError(f"Please set your {label} in config.ini")
 
-    if config.email.port in ["", "YOUR_EMAIL_PORT"]:
-        raise ValueError("Please set your email port in config.ini")
+    for section, option in INT_OPTIONS:
+        if not isinstance(getattr(getattr(config, section), option), int):
+            raise ValueError(f"Please set a valid integer for {option} in config.ini")
 
-    if config.debug.log_level not in ["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"]:
+    if config.debug.log_level not in LOG_LEVELS:
         raise ValueError(
             """Please set a valid log level in config.ini\n
             Must be: DEBUG, INFO, WARNING, ERROR, CRITICAL"""
@@ -260,4 +301,4 @@ def get_base_dir() -> str:
     Returns:
         str: The base directory.
     """
-    return os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return _BASE_DIR
@@ -4,42 +4,91 @@ Module to handle database operations.
 
 from datetime import datetime
 import os
+import random
 import sqlite3
 import logging
+import threading
 
 logger = logging.getLogger(__name__)
 
+_SQL_SETUP_CONNECTION = """PRAGMA journal_mode=WAL;
+                        PRAGMA synchronous=NORMAL;
+                        PRAGMA temp_store=MEMORY;
+                        PRAGMA mmap_size=268435456;
+                        PRAGMA cache_size=-20000;
+                        CREATE TEMP TABLE IF NOT EXISTS _keep
+                            (message_id INTEGER PRIMARY KEY);"""
+_SQL_CREATE_SCHEMA = """CREATE TABLE IF NOT EXISTS pinned_messages
+                    (id INTEGER PRIMARY KEY, message_id INTEGER UNIQUE,
+                    message TEXT, date DATETIME, photo BLOB);
+                 CREATE INDEX IF NOT EXISTS idx_pm_date
+                    ON pinned_messages(date);"""
+_SQL_TABLE_EXISTS = """SELECT name FROM sqlite_master
+                       WHERE type='table' AND name=?"""
+_SQL_INSERT_OR_IGNORE = """INSERT OR IGNORE INTO pinned_messages
+                        (message_id, message, date, photo)
+                        VALUES (?, ?, ?, ?)"""
+_SQL_CLEAR_KEEP_TABLE = """DELETE FROM _keep"""
+_SQL_INSERT_KEEP = """INSERT OR IGNORE INTO _keep (message_id) VALUES (?)"""
+_SQL_DELETE_UNPINNED = """DELETE FROM pinned_messages
+                       WHERE NOT EXISTS (SELECT 1 FROM _keep k
+                       WHERE k.message_id = pinned_messages.message_id)"""
+_SQL_GET_COUNT = """SELECT COUNT(*) FROM pinned_messages"""
+_SQL_GET_LAST_UPDATE = """SELECT MAX(date) FROM pinned_messages"""
+_SQL_GET_MESSAGE_BY_ID = """SELECT * FROM pinned_messages
+                       WHERE message_id = ?"""
+_SQL_GET_RECENT_BY_DATE = """SELECT * FROM pinned_messages
+                       WHERE date > ?"""
+_SQL_GET_ROW_IDS = """SELECT id FROM pinned_messages"""
+_SQL_GET_MESSAGE_BY_ROW_ID = """SELECT * FROM pinned_messages
+                       WHERE id = ?"""
+_SQL_GET_RECENT_BY_ROW_ID = """SELECT * FROM pinned_messages
+                       WHERE id >= ?"""
+_SQL_OPTIMIZE = """PRAGMA optimize"""
+
 
 class Database:
     """
     A class to represent a database object using SQLite3.
+    Each thread gets its own connection, opened on first use and reused.
     """
 
     def __init__(self, base_dir: str, db_path: str):
         """
-        Initializes the Database object.
+        Initializes the Database object, setting the connection pragmas
+        and creating the pinned_messages table and its indexes if needed.
 
         Args:
             base_dir (str): The base directory of the project.
             db_path (str): The path to the database file.
         """
-        full_db_path = os.path.abspath(os.path.join(base_dir, db_path))
-        if not os.path.exists(full_db_path):
-            with open(full_db_path, "w", encoding="utf-8"):
-                pass
-        self.conn = sqlite3.connect(full_db_path)
-        self.c = self.conn.cursor()
+        self._full_db_path = os.path.abspath(os.path.join(base_dir, db_path))
+        self._local = threading.local()
+        self._connections: list[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+
+        self.table_created: bool = not self.table_exists("pinned_messages")
+        self._conn().executescript(_SQL_CREATE_SCHEMA)
 
-    def create_table(self) -> None:
+    def _conn(self) -> sqlite3.Connection:
         """
-        Creates the pinned_messages table if it doesn't exist.
+        Gets the connection of the current thread, opening it, setting the
+        connection pragmas and creating its temporary tables on first use.
+
+        Returns:
+            sqlite3.Connection: The connection of the current thread.
         """
-        self.c.execute(
-            """CREATE TABLE IF NOT EXISTS pinned_messages
-                    (id INTEGER PRIMARY KEY, message_id INTEGER UNIQUE,
-                    message TEXT, date DATETIME, photo BLOB)"""
-        )
-        self.conn.commit()
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(
+                self._full_db_path, cached_statements=256, check_same_thread=False
+            )
+            conn.row_factory = sqlite3.Row
+            conn.executescript(_SQL_SETUP_CONNECTION)
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
 
     def table_exists(self, table_name: str) -> bool:
         """
@@ -51,12 +100,8 @@ class Database:
         Returns:
             bool: True if the table exists, False otherwise.
         """
-        self.c.execute(
-            """SELECT name FROM sqlite_master
-                       WHERE type='table' AND name=?""",
-            (table_name,),
-        )
-        return self.c.fetchone() is not None
+        cursor = self._conn().execute(_SQL_TABLE_EXISTS, (table_name,))
+        return cursor.fetchone() is not None
 
     def insert_or_ignore(
         self,
@@ -75,20 +120,16 @@ class Database:
         Returns:
             None | str: The last update date if get_last_update is True.
         """
-        last_update = self.get_last_update()
-        logger.debug(f"Last update: {last_update}")
-
-        self.c.executemany(
-            """INSERT OR IGNORE INTO pinned_messages
-                        (message_id, message, date, photo)
-                        VALUES (?, ?, ?, ?)""",
-            values,
-        )
+        last_update = None
+        if get_last_update:
+            last_update = self.get_last_update()
+            logger.debug("Last update: %s", last_update)
 
-        self.conn.commit()
+        conn = self._conn()
+        with conn:
+            conn.executemany(_SQL_INSERT_OR_IGNORE, values)
 
-        if get_last_update:
-            return last_update
+        return last_update
 
     def remove_unpinned_messages(self, message_ids: list[int]) -> None:
         """
@@ -98,12 +139,57 @@ class Database:
         Args:
             message_ids (list[int]): The list of message IDs to keep.
         """
-        placeholders = ", ".join("?" * len(message_ids))
-        query = f"""DELETE FROM pinned_messages
-                    WHERE message_id NOT IN ({placeholders})"""
+        conn = self._conn()
+        with conn:
+            self._delete_unpinned_messages(conn, message_ids)
+
+    def sync_pinned_messages(
+        self,
+        values: list[tuple[int, str, datetime, bytes | None]],
+        get_last_update: bool,
+    ) -> None | str:
+        """
+        Removes the messages that are no longer pinned and inserts the given
+        values, ignoring any duplicates, in a single transaction.
 
-        self.c.execute(query, message_ids)
-        self.conn.commit()
+        Args:
+            values (list[tuple[int, str, datetime, bytes | None]]): The values
+                of the currently pinned messages.
+            get_last_update (bool): Whether to return the last update date.
+
+        Returns:
+            None | str: The last update date if get_last_update is True.
+        """
+        last_update = None
+        conn = self._conn()
+        with conn:
+            self._delete_unpinned_messages(conn, [v[0] for v in values])
+            # read after the deletion, so that the date of a message that
+            # is no longer pinned is not used as the last update
+            if get_last_update:
+                last_update = self.get_last_update()
+                logger.debug("Last update: %s", last_update)
+            conn.executemany(_SQL_INSERT_OR_IGNORE, values)
+
+        return last_update
+
+    @staticmethod
+    def _delete_unpinned_messages(
+        conn: sqlite3.Connection, message_ids: list[int]
+    ) -> None:
+        """
+        Deletes messages that are not in the given list of message IDs,
+        without committing.
+
+        Args:
+            conn (sqlite3.Connection): The connection to use.
+            message_ids (list[int]): The list of message IDs to keep.
+        """
+        # the IDs to keep go through a temporary table rather than an IN list,
+        # which would be limited by the maximum number of SQL parameters
+        conn.execute(_SQL_CLEAR_KEEP_TABLE)
+        conn.executemany(_SQL_INSERT_KEEP, ((m,) for m in message_ids))
+        conn.execute(_SQL_DELETE_UNPINNED)
 
     def get_count(self) -> int:
         """
@@ -112,8 +198,7 @@ class Database:
         Returns:
             int: The number of rows in the table.
         """
-        self.c.execute("""SELECT COUNT(*) FROM pinned_messages""")
-        return self.c.fetchone()[0]
+        return self._conn().execute(_SQL_GET_COUNT).fetchone()[0]
 
     def get_last_update(self) -> str:
         """
@@ -122,10 +207,9 @@ class Database:
         Returns:
             str: The most recent date in the table.
         """
-        self.c.execute("""SELECT MAX(date) FROM pinned_messages""")
-        return self.c.fetchone()[0]
+        return self._conn().execute(_SQL_GET_LAST_UPDATE).fetchone()[0]
 
-    def get_message_by_id(self, message_id: int) -> tuple:
+    def get_message_by_id(self, message_id: int) -> sqlite3.Row:
         """
         Gets a message from the pinned_messages table by its message ID.
 
@@ -133,33 +217,41 @@ class Database:
             message_id (int): The message ID to search for.
 
         Returns:
-            tuple: The message with the given message ID
+            sqlite3.Row: The message with the given message ID
         """
-        self.c.execute(
-            """SELECT * FROM pinned_messages
-                       WHERE message_id = ?""",
-            (message_id,),
-        )
-        return self.c.fetchone()
+        return self._conn().execute(_SQL_GET_MESSAGE_BY_ID, (message_id,)).fetchone()
 
-    def get_random_messages(self, count: int) -> list:
+    def get_random_messages(self, count: int) -> list[sqlite3.Row]:
         """
         Gets a random selection of messages from the pinned_messages table,
         up to the specified count.
 
         Args:
-            count (int): The number of messages to get.
+            count (int): The number of messages to get. A negative count
+                gets all of them, as with a negative SQL LIMIT.
 
         Returns:
-            list: A list of randomly selected messages.
+            list[sqlite3.Row]: A list of randomly selected messages.
         """
-        self.c.execute(
-            f"""SELECT * FROM pinned_messages
-                       ORDER BY RANDOM() LIMIT {count}"""
-        )
-        return self.c.fetchall()
-
-    def get_recent_messages_by_date(self, date_value: str | datetime) -> list:
+        # sample row IDs (read from an index, without the row contents)
+        # rather than sorting the whole table with ORDER BY RANDOM()
+        conn = self._conn()
+        row_ids = [row[0] for row in conn.execute(_SQL_GET_ROW_IDS)]
+        if not row_ids:
+            return []
+
+        if count < 0 or count > len(row_ids):
+            count = len(row_ids)
+
+        messages = []
+        for row_id in random.sample(row_ids, count):
+            cursor = conn.execute(_SQL_GET_MESSAGE_BY_ROW_ID, (row_id,))
+            messages.append(cursor.fetchone())
+        return messages
+
+    def get_recent_messages_by_date(
+        self, date_value: str | datetime
+    ) -> list[sqlite3.Row]:
         """
         Gets messages from the pinned_messages table that are more recent than
         the given date.
@@ -168,16 +260,11 @@ class Database:
             date_value (str | datetime): The date to compare against.
 
         Returns:
-            list: A list of messages more recent than the given date.
+            list[sqlite3.Row]: A list of messages more recent than the given date.
         """
-        self.c.execute(
-            """SELECT * FROM pinned_messages
-                       WHERE date > ?""",
-            (date_value,),
-        )
-        return self.c.fetchall()
+        return self._conn().execute(_SQL_GET_RECENT_BY_DATE, (date_value,)).fetchall()
 
-    def get_recent_messages_by_row_id(self, row_id: int) -> list:
+    def get_recent_messages_by_row_id(self, row_id: int) -> list[sqlite3.Row]:
         """
         Gets messages from the pinned_messages table that have a row ID greater
         than or equal to the given value.
@@ -187,18 +274,19 @@ class Database:
             row_id (int): The row ID to compare against.
 
         Returns:
-            list: A list of messages with row IDs greater than or equal to the
-                given value.
+            list[sqlite3.Row]: A list of messages with row IDs greater than or
+                equal to the given value.
         """
-        self.c.execute(
-            """SELECT * FROM pinned_messages
-                       WHERE id >= ?""",
-            (row_id,),
-        )
-        return self.c.fetchall()
+        return self._conn().execute(_SQL_GET_RECENT_BY_ROW_ID, (row_id,)).fetchall()
 
     def close(self):
         """
-        Closes the database connection.
+        Updates the query planner statistics if needed
+        and closes the database connections of all threads.
         """
-        self.conn.close()
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.execute(_SQL_OPTIMIZE)
+            conn.close()
+        self._local = threading.local()
@@ -2,11 +2,133 @@
 Module used to send emails.
 """
 
+import atexit
 import smtplib
+import threading
+from email.policy import SMTP
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 
 
+class _Mailer:
+    """
+    A class to keep a single SMTP connection open across emails,
+    so that the TLS handshake and login are only done once.
+    """
+
+    def __init__(self):
+        """
+        Initializes the _Mailer object without connecting.
+        """
+        self.server: smtplib.SMTP_SSL | None = None
+        self._credentials: tuple[str, str, str, int] | None = None
+        self._lock = threading.Lock()
+
+    def _get_server(
+        self, address: str, password: str, host: str, port: int
+    ) -> smtplib.SMTP_SSL:
+        """
+        Gets the open SMTP connection, connecting and logging in
+        if there is none or if it was closed by the server.
+
+        Args:
+            address (str): The email address to log in with.
+            password (str): The password for the email address.
+            host (str): The SMTP server host.
+            port (int): The SMTP server port.
+
+        Returns:
+            smtplib.SMTP_SSL: The SMTP connection.
+        """
+        credentials = (address, password, host, port)
+        if self.server is not None and self._credentials == credentials:
+            try:
+                if self.server.noop()[0] == 250:
+                    return self.server
+            except smtplib.SMTPServerDisconnected:
+                pass
+        self._quit()
+
+        server = smtplib.SMTP_SSL(host, port)
+        server.login(address, password)
+        self.server = server
+        self._credentials = credentials
+        return server
+
+    def _quit(self) -> None:
+        """
+        Closes the SMTP connection, if any.
+        """
+        if self.server is None:
+            return
+        try:
+            self.server.quit()
+        except smtplib.SMTPServerDisconnected:
+            pass
+        self.server = None
+        self._credentials = None
+
+    def send(
+        self, address: str, password: str, host: str, port: int, msg: bytes
+    ) -> None:
+        """
+        Sends the message to the given address, reusing the open SMTP
+        connection when possible.
+
+        Args:
+            address (str): The email address to log in with and send to.
+            password (str): The password for the email address.
+            host (str): The SMTP server host.
+            port (int): The SMTP server port.
+            msg (bytes): The serialized message to send.
+        """
+        with self._lock:
+            self._get_server(address, password, host, port).sendmail(
+                address, [address], msg
+            )
+
+    def close(self) -> None:
+        """
+        Closes the SMTP connection, if any.
+        """
+        with self._lock:
+            self._quit()
+
+
+_mailer = _Mailer()
+atexit.register(_mailer.close)
+
+
+def _serialize(
+    address: str, subject: str, html_content: str, plain_text: str
+) -> bytes:
+    """
+    Builds the email message with the SMTP policy (CRLF line endings)
+    and serializes it.
+
+    Args:
+        address (str): The email address used as sender and recipient.
+        subject (str): The subject of the email.
+        html_content (str): The HTML content of the email.
+        plain_text (str): The plain text content of the email.
+
+    Returns:
+        bytes: The serialized message.
+    """
+    msg = MIMEMultipart("alternative", policy=SMTP)
+    msg["From"] = address
+    msg["To"] = address
+    msg["Subject"] = subject
+
+    text_part = MIMEText(plain_text, "plain", policy=SMTP)
+    msg.attach(text_part)
+
+    html_part = MIMEText(html_content, "html", policy=SMTP)
+    msg.attach(html_part)
+
+    return msg.as_bytes()
+
+
 def send_email(
     address: str,
     password: str,
@@ -29,20 +151,15 @@ def send_email(
         plain_text (str): The plain text content of the email.
     """
     try:
-        msg = MIMEMultipart("alternative")
-        msg["From"] = address
-        msg["To"] = address
-        msg["Subject"] = subject
-
-        text_part = MIMEText(plain_text, "plain/markdown")
-        msg.attach(text_part)
-
-        html_part = MIMEText(html_content, "html")
-        msg.attach(html_part)
-
-        server = smtplib.SMTP_SSL(host, port)
-        server.login(address, password)
-        server.sendmail(address, address, msg.as_string())
-        server.quit()
+        msg = _serialize(address, subject, html_content, plain_text)
+        _mailer.send(address, password, host, port, msg)
     except Exception as e:
         raise e
+
+
+def close_connection() -> None:
+    """
+    Closes the SMTP connection shared by send_email, if any.
+    It is reopened by the next send_email call.
+    """
+    _mailer.close()
@@ -3,15 +3,19 @@ Script to retrieve pinned messages from a Telegram channel, store them in a data
 and send email alerts for new and reminder messages.
 """
 
+import asyncio
 import base64
+import functools
+import hashlib
 import os
 from datetime import datetime, timedelta
-import html2text
 import humanize
 import json
 import logging
+from operator import itemgetter
 import pytz
 import re
+import sqlite3
 
 from telethon import TelegramClient
 from telethon.tl.custom import Message
@@ -20,19 +24,19 @@ from telethon.helpers import TotalList
 
 from db.db import Database
 from config.config import load_config, validate_config, get_base_dir
-from emails.emails import send_email
+from emails.emails import send_email, close_connection
 
 CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
 
 CONFIG = load_config()
 
 # [alerts]
-ALERT_NEW = CONFIG.getboolean("alerts", "alert_new")
-ALERT_NEW_TIME_WINDOW_MINUTES = int(CONFIG.alerts.alert_new_time_window_minutes)
+ALERT_NEW = CONFIG.alerts.alert_new
+ALERT_NEW_TIME_WINDOW_MINUTES = CONFIG.alerts.alert_new_time_window_minutes
 
-ALERT_REMINDER = CONFIG.getboolean("alerts", "alert_reminder")
+ALERT_REMINDER = CONFIG.alerts.alert_reminder
 REMINDER_LIMIT = CONFIG.alerts.alert_reminder_limit
-INCLUDE_CHANNEL = CONFIG.getboolean("alerts", "include_channel")
+INCLUDE_CHANNEL = CONFIG.alerts.include_channel
 
 # [telegram]
 API_ID = CONFIG.telegram.api_id
@@ -56,15 +60,15 @@ TIME_FORMAT = CONFIG.time.time_format
 
 # [debug]
 LOG_LEVEL = CONFIG.debug.log_level
-LOG_CHILDREN = CONFIG.getboolean("debug", "log_children")
-SAVE_LOGS_TO_FILE = CONFIG.getboolean("debug", "save_logs_to_file")
+LOG_CHILDREN = CONFIG.debug.log_children
+SAVE_LOGS_TO_FILE = CONFIG.debug.save_logs_to_file
 LOG_PATH = CONFIG.debug.log_path
 
-validate_config(CONFIG)
+with open(os.path.join(CURRENT_DIR, EMAIL_STRINGS_PATH), "rb") as f:
+    EMAIL_STRINGS = json.load(f)
 
-EMAIL_STRINGS = json.loads(
-    open(os.path.join(CURRENT_DIR, EMAIL_STRINGS_PATH), "r").read()
-)
+with open(os.path.join(CURRENT_DIR, EMAIL_TEMPLATE_PATH), "r", encoding="utf8") as f:
+    EMAIL_TEMPLATE = f.read()
 
 TZ = pytz.timezone(TIMEZONE)
 
@@ -73,6 +77,22 @@ CHANNEL_MAP = {
     "Me": "Saved Messages",
 }
 
+# channel name shown in the emails
+CHANNEL_NAME = (
+    CHANNEL_MAP.get(CHANNEL.title(), "Unknown Channel Mapping")
+    if INCLUDE_CHANNEL
+    else ""
+)
+
+URL_RE = re.compile(r"(https?://[^/]+(?:[^\s]*))")
+HTML_TAG_RE = re.compile(r"<[^>]+>")
+
+# image data URIs, keyed by a hash of the image content
+IMAGE_SRC_CACHE: dict[bytes, str] = {}
+
+# maximum number of images downloaded from Telegram at the same time
+MAX_CONCURRENT_DOWNLOADS = 8
+
 # set up logging
 logfmt = logging.Formatter(
     "[%(asctime)-15s] {%(pathname)s:%(lineno)d} " "%(levelname)-4s %(message)s"
@@ -83,28 +103,35 @@ if LOG_CHILDREN:
 else:
     logger = logging.getLogger(__name__)
 
-logger.setLevel(LOG_LEVEL)
-
-if SAVE_LOGS_TO_FILE:
-    fh = logging.FileHandler(LOG_PATH)
-    fh.setLevel(LOG_LEVEL)
-    fh.setFormatter(logfmt)
-    logger.addHandler(fh)
-
-ch = logging.StreamHandler()
-ch.setLevel(LOG_LEVEL)
-ch.setFormatter(logfmt)
-logger.addHandler(ch)
-
-logger.debug(
-    f"""Launching script with the following configuration
-    from {CONFIG.get_config_path()}:\n\n{CONFIG.list_config_values()}"""
-)
 
-if not any((ALERT_NEW, ALERT_REMINDER)):
-    logger.warning("No alerts enabled! No emails will be sent.")
+def setup_logging() -> None:
+    """
+    Sets the log level and handlers from the configuration,
+    and logs the configuration the script is launched with.
+    """
+    logger.setLevel(LOG_LEVEL)
+
+    if SAVE_LOGS_TO_FILE:
+        fh = logging.FileHandler(LOG_PATH)
+        fh.setLevel(LOG_LEVEL)
+        fh.setFormatter(logfmt)
+        logger.addHandler(fh)
+
+    ch = logging.StreamHandler()
+    ch.setLevel(LOG_LEVEL)
+    ch.setFormatter(logfmt)
+    logger.addHandler(ch)
+
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(
+            """Launching script with the following configuration
+    from %s:\n\n%s""",
+            CONFIG.get_config_path(),
+            CONFIG.list_config_values(),
+        )
 
-TELEGRAM_CLIENT = TelegramClient("anon", API_ID, API_HASH)
+    if not any((ALERT_NEW, ALERT_REMINDER)):
+        logger.warning("No alerts enabled! No emails will be sent.")
 
 
 def url_to_anchor(url: str) -> str:
@@ -117,7 +144,20 @@ def url_to_anchor(url: str) -> str:
     Returns:
         str: The HTML anchor tag representing the URL.
     """
-    return re.sub(r"(https?://[^/]+(?:[^\s]*))", r'<a href="\1">\1</a>', url)
+    return URL_RE.sub(r'<a href="\1">\1</a>', url)
+
+
+def strip_tags(html: str) -> str:
+    """
+    Converts a short HTML snippet (such as an email string) to plain text.
+
+    Args:
+        html (str): The HTML snippet.
+
+    Returns:
+        str: The plain text.
+    """
+    return HTML_TAG_RE.sub("", html.replace("<br>", "\n"))
 
 
 def get_image_src(image_blob: bytes) -> str:
@@ -130,9 +170,16 @@ def get_image_src(image_blob: bytes) -> str:
     Returns:
         str: The image source.
     """
-    return f'data:image/png;base64,{base64.b64encode(image_blob).decode("utf-8")}'
+    key = hashlib.blake2b(image_blob, digest_size=16).digest()
+    image_src = IMAGE_SRC_CACHE.get(key)
+    if image_src is None:
+        encoded = base64.b64encode(image_blob).decode("ascii")
+        image_src = "data:image/png;base64," + encoded
+        IMAGE_SRC_CACHE[key] = image_src
+    return image_src
 
 
+@functools.lru_cache(maxsize=32)
 def encode_image(image_path: str) -> str:
     """
     Encodes an image to base64.
@@ -144,8 +191,7 @@ def encode_image(image_path: str) -> str:
         str: The base64-encoded image.
     """
     with open(image_path, "rb") as image_file:
-        encoded_string = base64.b64encode(image_file.read()).decode()
-    return f"data:image/png;base64,{encoded_string}"
+        return get_image_src(image_file.read())
 
 
 def get_email_string(token: str, count: int = 0, include_channel: bool = False) -> str:
@@ -183,7 +229,7 @@ def humanize_time_diff(d1: datetime, d2: datetime) -> str:
 
 def setup_database() -> tuple[Database, bool, bool]:
     """
-    Sets up the database by creating a table if it doesn't exist.
+    Sets up the database (the table is created if it doesn't exist).
     Returns the database instance, along with alert settings for new messages.
 
     Returns:
@@ -191,25 +237,19 @@ def setup_database() -> tuple[Database, bool, bool]:
         and the alert settings for new messages (both by time window and last update).
     """
     db_instance = Database(get_base_dir(), DB_PATH)
-    table_exists = db_instance.table_exists("pinned_messages")
 
-    alert_new_get_by_last_update = CONFIG.getboolean(
-        "alerts", "alert_new_get_by_last_update"
-    )
-    alert_new_get_by_time_window = CONFIG.getboolean(
-        "alerts", "alert_new_get_by_time_window"
-    )
+    alert_new_get_by_last_update = CONFIG.alerts.alert_new_get_by_last_update
+    alert_new_get_by_time_window = CONFIG.alerts.alert_new_get_by_time_window
 
-    if not table_exists:
+    if db_instance.table_created:
         if alert_new_get_by_last_update:
-            logger.warn(
+            logger.warning(
                 """get_by_last_update cannot be used without a table\n
                 Forcing get_by_time_window"""
             )
             alert_new_get_by_last_update = False
             alert_new_get_by_time_window = True
-        logger.info("Table does not exist; creating...")
-        db_instance.create_table()
+        logger.info("Table did not exist; created")
 
     return db_instance, alert_new_get_by_time_window, alert_new_get_by_last_update
 
@@ -231,18 +271,30 @@ async def process_pinned_messages(
     """
     pinned_messages = await get_pinned_messages(telegram_client, channel)
     total_count = len(pinned_messages)
-    pin_data = sorted(
-        [
-            (
-                m.id,
-                m.text,
-                m.date.replace(tzinfo=pytz.utc).astimezone(TZ),
-                await get_image_data(m),
-            )
-            for m in pinned_messages
-        ],
-        key=lambda x: x[0],
+    # only photo messages get a download task; the others have no image
+    photo_indexes = [
+        i
+        for i, m in enumerate(pinned_messages)
+        if isinstance(m.media, MessageMediaPhoto)
+    ]
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_DOWNLOADS)
+    downloads = await asyncio.gather(
+        *(download_image(pinned_messages[i], semaphore) for i in photo_indexes)
     )
+    images: list[bytes | None] = [None] * total_count
+    for i, image in zip(photo_indexes, downloads):
+        images[i] = image
+    pin_data = [
+        (
+            m.id,
+            m.text,
+            m.date.replace(tzinfo=pytz.utc).astimezone(TZ),
+            image,
+        )
+        for m, image in zip(pinned_messages, images)
+    ]
+    # Telegram returns pins newest first; timsort handles that run in O(n)
+    pin_data.sort(key=itemgetter(0))
     return pin_data, total_count
 
 
@@ -264,10 +316,7 @@ def update_database(
     Returns:
         str | None: The last update time if alerting by last update, otherwise None.
     """
-    messages_ids = [m[0] for m in pin_data]
-    db_instance.remove_unpinned_messages(messages_ids)
-    last_update = db_instance.insert_or_ignore(pin_data, alert_new_get_by_last_update)
-    return last_update
+    return db_instance.sync_pinned_messages(pin_data, alert_new_get_by_last_update)
 
 
 def get_recent_messages(
@@ -275,7 +324,7 @@ def get_recent_messages(
     alert_new_get_by_time_window: bool,
     alert_new_get_by_last_update: bool,
     last_update: str | None,
-) -> tuple[list[tuple], datetime]:
+) -> tuple[list, datetime]:
     """
     Retrieves the recent messages from the database based on the specified criteria.
 
@@ -288,7 +337,7 @@ def get_recent_messages(
         last_update (str | None): The last update time to retrieve messages from.
 
     Returns:
-        Tuple[List[Message], datetime]: A tuple containing the list of retrieved messages
+        tuple[list, datetime]: A tuple containing the list of retrieved messages
         (if any) and the time window used for retrieval.
     """
     time_window = datetime.now(TZ) - timedelta(minutes=ALERT_NEW_TIME_WINDOW_MINUTES)
@@ -306,18 +355,16 @@ def process_alerts(
     Processes alerts based on the messages.
 
     Args:
-        messages (list): List of messages.
+        messages (list): List of message rows.
         total_count (int): Total count of messages.
         time_window (datetime): Time window for the alerts.
         alert_type (str): Type of alert.
     """
     count = len(messages)
     if count > 0:
-        messages = [(m[1], url_to_anchor(m[2]), m[3], m[4]) for m in messages]
-        html = generate_html_content(
+        html, plain_text = generate_html_content(
             messages, count, total_count, time_window, alert_type
         )
-        plain_text = html2text.html2text(html)
         send_email_with_html(
             get_email_string(f"subject_{alert_type}", count),
             count,
@@ -349,13 +396,13 @@ def send_email_with_html(subject: str, count: int, html: str, plain_text: str) -
 
 def generate_html_content(
     messages: list, count: int, total_count: int, time_window: datetime, _type: str = ""
-) -> str:
+) -> tuple[str, str]:
     """
-    Generates HTML content for an email template using the provided messages.
+    Generates HTML content for an email template using the provided messages,
+    along with the matching plain text content.
 
     Args:
-        messages (list): A list of messages,
-        where each message is a tuple containing the message details.
+        messages (list): A list of message rows from the database.
         count (int): The count value used in the HTML content formatting.
         total_count (int): The total count of messages used in the
         HTML content formatting.
@@ -364,61 +411,85 @@ def generate_html_content(
         used to retrieve the email strings.
 
     Returns:
-        str: The generated HTML content for the email template.
-    """
-    with open(
-        os.path.join(CURRENT_DIR, EMAIL_TEMPLATE_PATH), "r", encoding="utf8"
-    ) as f:
-        return f.read().format(
-            logo=encode_image(os.path.join(CURRENT_DIR, "assets/logo.png")),
-            title=get_email_string("title_" + _type),
-            intro_msg=get_email_string(
-                "intro_msg_" + _type, count, INCLUDE_CHANNEL
-            ).format(
-                c=count,
-                total_msg=get_email_string("total", total_count).format(t=total_count),
-                d=time_window.strftime(TIME_FORMAT),
-                ch=(
-                    CHANNEL_MAP.get(CHANNEL.title(), "Unknown Channel Mapping")
-                    if INCLUDE_CHANNEL
-                    else ""
-                ),
-            ),
-            table="".join(
-                f"""
-                <tr>
-                <td style="padding: 10px;">{m[0]}</td>
-                <td style="padding: 10px;">{m[1]}<br>
-                {f"<img src='{get_image_src(m[3])}'style='max-width:300px;height:auto;'/>"
-                 if m[3] else ""}</td>
-                <td style="padding: 10px;">{datetime.fromisoformat(m[2])
-                                            .strftime(TIME_FORMAT)}
-                <br>(<b>{humanize_time_diff
-                         (
-                          datetime.now(TZ),
-                          datetime.fromisoformat(m[2])
-                          .replace(tzinfo=pytz.timezone(TIMEZONE)),
-                         )}</b>)</td>
-                </tr>
-                """
-                for m in messages
-            ),
-        )
+        tuple[str, str]: The generated HTML content for the email template,
+        and the plain text content.
+    """
+    now = datetime.now(TZ)
+    rows = []
+    plain_rows = []
+    for m in messages:
+        row, plain_row = generate_table_row(m, now)
+        rows.append(row)
+        plain_rows.append(plain_row)
+    table = "".join(rows)
+
+    title = get_email_string(f"title_{_type}")
+    intro_msg = get_email_string(f"intro_msg_{_type}", count, INCLUDE_CHANNEL).format(
+        c=count,
+        total_msg=get_email_string("total", total_count).format(t=total_count),
+        d=time_window.strftime(TIME_FORMAT),
+        ch=CHANNEL_NAME,
+    )
+
+    html = EMAIL_TEMPLATE.format(
+        logo=encode_image(os.path.join(CURRENT_DIR, "assets/logo.png")),
+        title=title,
+        intro_msg=intro_msg,
+        table=table,
+    )
+    plain_text = f"{title}\n\n{strip_tags(intro_msg)}\n\n{''.join(plain_rows)}"
+    return html, plain_text
 
 
-async def get_image_data(message: Message) -> bytes | None:
+def generate_table_row(message: sqlite3.Row, now: datetime) -> tuple[str, str]:
     """
-    Retrieves the image data from a given message.
+    Generates the HTML table row of a message for the email template,
+    along with its plain text version.
+
+    Args:
+        message (sqlite3.Row): The message row from the database (row ID,
+        message ID, message text, ISO-formatted date, and image data).
+        now (datetime): The current time, used for the time difference.
+
+    Returns:
+        tuple[str, str]: The HTML table row and its plain text version.
+    """
+    # parsed once; stored dates already carry their UTC offset
+    date = datetime.fromisoformat(message[3])
+    date_str = date.strftime(TIME_FORMAT)
+    time_diff = humanize_time_diff(now, date)
+    image = (
+        f"<img src='{get_image_src(message[4])}'style='max-width:300px;height:auto;'/>"
+        if message[4]
+        else ""
+    )
+    row = f"""
+            <tr>
+            <td style="padding: 10px;">{message[1]}</td>
+            <td style="padding: 10px;">{url_to_anchor(message[2])}<br>
+            {image}</td>
+            <td style="padding: 10px;">{date_str}
+            <br>(<b>{time_diff}</b>)</td>
+            </tr>
+            """
+    plain_row = f"{message[1]}\n{message[2]}\n{date_str} ({time_diff})\n\n"
+    return row, plain_row
+
+
+async def download_image(message: Message, semaphore: asyncio.Semaphore) -> bytes:
+    """
+    Downloads the image data from a given photo message.
 
     Args:
         message (Message): The message containing the image.
+        semaphore (asyncio.Semaphore): The semaphore limiting the number
+        of concurrent downloads.
 
     Returns:
         bytes: The image data.
     """
-    if isinstance(message.media, MessageMediaPhoto):
+    async with semaphore:
         return await message.download_media(bytes)
-    return None
 
 
 async def get_pinned_messages(client: TelegramClient, channel: str) -> TotalList | list:
@@ -445,12 +516,16 @@ async def get_pinned_messages(client: TelegramClient, channel: str) -> TotalList
     return [pinned_messages]
 
 
-async def main():
+async def main(telegram_client: TelegramClient):
+    # nothing would use the pins; skip fetching them and updating the database
+    if not (ALERT_NEW or ALERT_REMINDER):
+        return
+
     db_instance, alert_new_get_by_time_window, alert_new_get_by_last_update = (
         setup_database()
     )
 
-    pin_data, total_count = await process_pinned_messages(TELEGRAM_CLIENT, CHANNEL)
+    pin_data, total_count = await process_pinned_messages(telegram_client, CHANNEL)
 
     last_update = update_database(db_instance, pin_data, alert_new_get_by_last_update)
 
@@ -468,8 +543,14 @@ async def main():
         reminder_messages = db_instance.get_random_messages(REMINDER_LIMIT)
         process_alerts(reminder_messages, total_count, time_window, "reminder")
 
+    close_connection()
     db_instance.close()
 
 
-with TELEGRAM_CLIENT:
-    TELEGRAM_CLIENT.loop.run_until_complete(main())
+if __name__ == "__main__":
+    validate_config(CONFIG)
+    setup_logging()
+
+    telegram_client = TelegramClient("anon", API_ID, API_HASH)
+    with telegram_client:
+        telegram_client.loop.run_until_complete(main(telegram_client))